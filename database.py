@@ -6,39 +6,167 @@ Provides initialization and simple CRUD helpers for:
 - handbook (tree-like reference)
 - students and neighbors
 
-The DB file is placed next to this module (dormhelper.db).
+The DB file is placed next to this module (dormhelper.db). Set the DB_URI
+environment variable to use another file, or ":memory:" for an ephemeral
+in-memory DB (tests, smoke runs). Set DB_WAL2=1 to request WAL2 journaling on
+SQLite builds that support it (falls back to WAL otherwise).
 """
 from __future__ import annotations
 
 import os
 import sqlite3
-from datetime import datetime
-from typing import List, Optional, Dict, Any
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Dict, Any, Tuple
 
 DB_FILENAME = "dormhelper.db"
 
+# PRAGMA user_version once legacy ISO timestamps have been converted to Unix seconds
+_UNIX_TIMESTAMPS_VERSION = 1
+
+# Single long-lived connection shared by all helpers (see get_conn)
+_CONN: Optional[sqlite3.Connection] = None
+# Set by close_conn(); stops get_conn() from lazily reopening during shutdown
+_CLOSED = False
+_LOCK = threading.RLock()
+
+# Hot-path SQL kept as module constants so every call hands the driver the
+# same string and hits its statement cache
+_SQL_INSERT_NEWS = "INSERT INTO news (title, content, created_at) VALUES (?, ?, ?)"
+_SQL_GET_NEWS = "SELECT id, title, content, created_at FROM news ORDER BY id DESC LIMIT ?"
+_SQL_GET_NEWS_BY_ID = "SELECT id, title, content, created_at FROM news WHERE id = ?"
+_SQL_GET_REQUESTS = "SELECT id, request_type, status, created_at, description, room FROM requests ORDER BY id DESC LIMIT ?"
+_SQL_GET_REQUESTS_BY_ROOM = "SELECT * FROM requests WHERE room = ? ORDER BY created_at DESC"
+_SQL_UPDATE_REQUEST_STATUS = "UPDATE requests SET status = ?, updated_at = ? WHERE id = ?"
+_SQL_DELETE_REQUESTS = "DELETE FROM requests"
+_SQL_RESET_REQUESTS_SEQ = "DELETE FROM sqlite_sequence WHERE name = 'requests'"
+_SQL_INSERT_HANDBOOK = "INSERT INTO handbook (parent_id, title, content, sort_order) VALUES (?, ?, ?, ?)"
+_SQL_DELETE_HANDBOOK = "DELETE FROM handbook WHERE title = ?"
+_SQL_GET_HANDBOOK_ROOTS = "SELECT * FROM handbook WHERE parent_id IS NULL ORDER BY sort_order, id"
+_SQL_GET_HANDBOOK_CHILDREN = "SELECT * FROM handbook WHERE parent_id = ? ORDER BY sort_order, id"
+_SQL_GET_HANDBOOK_SUBTREE = """
+    WITH RECURSIVE t(id, parent_id, title, content, sort_order, depth) AS (
+        SELECT id, parent_id, title, content, sort_order, 0 FROM handbook WHERE parent_id IS ?
+        UNION ALL
+        SELECT h.id, h.parent_id, h.title, h.content, h.sort_order, t.depth + 1
+        FROM handbook h JOIN t ON h.parent_id = t.id
+    )
+    SELECT * FROM t ORDER BY depth, sort_order, id
+"""
+_SQL_INSERT_STUDENT = "INSERT INTO students (full_name, room, floor, created_at) VALUES (?, ?, ?, ?)"
+_SQL_GET_STUDENT = "SELECT * FROM students WHERE id = ?"
+_SQL_FIND_STUDENTS_BY_ROOM = "SELECT * FROM students WHERE room = ? ORDER BY full_name"
+_SQL_GET_STUDENT_BY_NAME_ROOM = "SELECT id FROM students WHERE full_name = ? AND room = ? LIMIT 1"
+_SQL_UPDATE_STUDENT = "UPDATE students SET full_name = ?, room = ?, floor = ? WHERE id = ?"
+_SQL_INSERT_NEIGHBOR = "INSERT INTO neighbors (student_id, name, contact) VALUES (?, ?, ?)"
+_SQL_GET_NEIGHBORS = "SELECT * FROM neighbors WHERE student_id = ?"
+
 
 def get_db_path() -> str:
-    """Return absolute path to the database file next to this module."""
+    """Return DB_URI if set, else absolute path to the database file next to this module."""
+    uri = os.environ.get("DB_URI")
+    if uri:
+        return uri
     base = os.path.dirname(__file__)
     return os.path.join(base, DB_FILENAME)
 
 
 def get_conn() -> sqlite3.Connection:
-    """Get a sqlite3 connection with row factory set."""
-    conn = sqlite3.connect(get_db_path())
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Return the shared sqlite3 connection, opening it on first use.
+
+    The connection has the row factory and pragmas applied exactly once.
+    It may be used from several threads; callers must hold ``_LOCK``
+    (see ``_locked_conn``).
+    """
+    global _CONN
+    if _CONN is None:
+        with _LOCK:
+            if _CLOSED:
+                raise sqlite3.ProgrammingError("database connection was closed by close_conn()")
+            if _CONN is None:
+                # Hot queries are fixed literals, so a larger statement cache
+                # lets them skip re-preparation on every call
+                path = get_db_path()
+                conn = sqlite3.connect(path, check_same_thread=False, cached_statements=256)
+                conn.row_factory = sqlite3.Row
+                # auto_vacuum can only be chosen while the DB is brand new (no pages
+                # yet), so it has to come before the WAL switch and any CREATE TABLE
+                if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+                    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                # WAL must be in place before synchronous=NORMAL is safe to use
+                if path != ":memory:":
+                    mode = None
+                    if os.environ.get("DB_WAL2"):
+                        # builds without wal2 ignore the request and report the current mode
+                        mode = conn.execute("PRAGMA journal_mode=WAL2").fetchone()[0]
+                    if mode is None or mode.lower() != "wal2":
+                        conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("PRAGMA temp_store=MEMORY")
+                conn.execute("PRAGMA mmap_size=268435456")
+                conn.execute("PRAGMA cache_size=-20000")
+                _CONN = conn
+    return _CONN
+
+
+@contextmanager
+def _locked_conn() -> Iterator[sqlite3.Connection]:
+    """Hold the DB lock and yield the shared connection.
+
+    Any transaction left open by a failing helper is rolled back so it does
+    not leak into the next caller.
+    """
+    with _LOCK:
+        conn = get_conn()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def optimize() -> None:
+    """Let SQLite refresh query planner statistics (cheap; run periodically)."""
+    with _locked_conn() as conn:
+        conn.execute("PRAGMA optimize")
+
+
+def close_conn() -> None:
+    """Run a final PRAGMA optimize and close the shared connection.
+
+    Safe to call from a shutdown hook: a failing optimize (e.g. "database is
+    locked") is ignored, since it is only a planner-statistics refresh.
+    Afterwards get_conn() raises instead of silently reopening the DB.
+    """
+    global _CONN, _CLOSED
+    with _LOCK:
+        _CLOSED = True
+        if _CONN is None:
+            return
+        try:
+            _CONN.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        finally:
+            _CONN.close()
+            _CONN = None
 
 
-def _now_iso() -> str:
-    return datetime.utcnow().isoformat(timespec="seconds")
+def _now_ts() -> int:
+    """Current time as integer Unix seconds (what created_at/updated_at store)."""
+    return int(time.time())
 
 
 def init_db() -> None:
-    """Create tables if they don't exist."""
-    with get_conn() as conn:
+    """Create tables if they don't exist.
+
+    Schema creation, migrations and seeding run in one transaction, so startup
+    costs a single commit; on a fatal error everything is rolled back.
+    """
+    with _locked_conn() as conn:
         cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
 
         # News / announcements
         cur.execute(
@@ -47,7 +175,7 @@ def init_db() -> None:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 title TEXT NOT NULL,
                 content TEXT NOT NULL,
-                created_at TEXT NOT NULL
+                created_at INTEGER NOT NULL
             )
             """
         )
@@ -62,8 +190,8 @@ def init_db() -> None:
                 description TEXT,
                 room TEXT,
                 status TEXT NOT NULL DEFAULT 'open',
-                created_at TEXT NOT NULL,
-                updated_at TEXT
+                created_at INTEGER NOT NULL,
+                updated_at INTEGER
             )
             """
         )
@@ -89,7 +217,7 @@ def init_db() -> None:
                 full_name TEXT NOT NULL,
                 room TEXT,
                 floor TEXT,
-                created_at TEXT NOT NULL
+                created_at INTEGER NOT NULL
             )
             """
         )
@@ -109,14 +237,20 @@ def init_db() -> None:
         # Useful indexes
         cur.execute("CREATE INDEX IF NOT EXISTS idx_requests_status ON requests(status)")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_students_room ON students(room)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_students_name_room ON students(full_name, room)")
 
         # --- Migrations: ensure expected columns exist in existing DBs ---
+        # One PRAGMA per table; the column sets are kept current as we ALTER
+        schema = {
+            t: {r[1] for r in cur.execute(f"PRAGMA table_info({t})")}
+            for t in ("news", "requests", "handbook", "students", "neighbors")
+        }
+
         def ensure_column(table: str, column: str, definition: str) -> None:
-            cur.execute(f"PRAGMA table_info({table})")
-            cols = [row[1] for row in cur.fetchall()]
-            if column not in cols:
+            if column not in schema[table]:
                 # SQLite supports ADD COLUMN with a column definition
                 cur.execute(f"ALTER TABLE {table} ADD COLUMN {definition}")
+                schema[table].add(column)
 
         # If the app used an older schema, add common missing columns
         try:
@@ -134,23 +268,14 @@ def init_db() -> None:
             # Migration errors should not prevent application from starting; log to stdout
             print("Warning: migration step failed (non-fatal)")
 
-        conn.commit()
-
         # Backfill common renamed columns for requests from older schemas
         try:
             # add requester_name/request_type if missing
-            def col_exists(table: str, col: str) -> bool:
-                cur.execute(f"PRAGMA table_info({table})")
-                return col in [r[1] for r in cur.fetchall()]
-
-            if not col_exists('requests', 'requester_name'):
-                cur.execute("ALTER TABLE requests ADD COLUMN requester_name TEXT")
-            if not col_exists('requests', 'request_type'):
-                cur.execute("ALTER TABLE requests ADD COLUMN request_type TEXT")
+            ensure_column("requests", "requester_name", "requester_name TEXT")
+            ensure_column("requests", "request_type", "request_type TEXT")
 
             # If old columns exist (type, student_name, created_date), copy them into new columns
-            cur.execute("PRAGMA table_info(requests)")
-            existing = [r[1] for r in cur.fetchall()]
+            existing = schema["requests"]
             if 'type' in existing:
                 cur.execute("UPDATE requests SET request_type = type WHERE request_type IS NULL OR request_type = ''")
             if 'student_name' in existing:
@@ -160,7 +285,33 @@ def init_db() -> None:
         except Exception:
             print("Warning: requests backfill failed (non-fatal)")
 
-        conn.commit()
+        # Legacy DBs hold utcnow() ISO text in TEXT timestamp columns; convert it
+        # to Unix seconds so it orders consistently with rows written by _now_ts().
+        # These are full scans, so run them once and record it in user_version.
+        if cur.execute("PRAGMA user_version").fetchone()[0] < _UNIX_TIMESTAMPS_VERSION:
+            try:
+                for table, column in (
+                    ("news", "created_at"),
+                    ("requests", "created_at"),
+                    ("requests", "updated_at"),
+                    ("students", "created_at"),
+                ):
+                    if column in schema[table]:
+                        cur.execute(
+                            f"UPDATE {table} SET {column} = CAST(strftime('%s', {column}) AS INTEGER)"
+                            f" WHERE {column} GLOB '*-*' AND strftime('%s', {column}) IS NOT NULL"
+                        )
+                cur.execute(f"PRAGMA user_version = {_UNIX_TIMESTAMPS_VERSION}")
+            except Exception:
+                print("Warning: timestamp conversion failed (non-fatal)")
+
+        # Sort index for get_requests_by_room (ORDER BY created_at DESC); created
+        # after migrations so legacy DBs already have the created_at column
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_requests_room_created ON requests(room, created_at DESC)"
+        )
+        # Child lookup for the recursive handbook CTE (parent_id may have been added by migration)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_handbook_parent ON handbook(parent_id, sort_order)")
 
         # Seed sample news if table is empty
         try:
@@ -181,141 +332,170 @@ def init_db() -> None:
                         "В среду с 09:00 до 12:00 будет проводиться плановое отключение воды на всех этажах.",
                     ),
                 ]
-                now = _now_iso()
-                for t, c in samples:
-                    cur.execute(
-                        "INSERT INTO news (title, content, created_at) VALUES (?, ?, ?)", (t, c, now)
-                    )
-                conn.commit()
+                now = _now_ts()
+                cur.executemany(_SQL_INSERT_NEWS, [(t, c, now) for t, c in samples])
                 print(f"Seeded {len(samples)} sample news items")
         except Exception:
             # non-fatal
             pass
 
+        cur.execute("COMMIT")
+
+        # Schema is settled now; cache it so add_request() needs no PRAGMA
+        _cache_requests_schema(schema["requests"])
+
 
 ### News helpers
 
 
 def add_news(title: str, content: str) -> int:
     """Insert news item, return id."""
-    now = _now_iso()
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO news (title, content, created_at) VALUES (?, ?, ?)",
-            (title, content, now),
-        )
+    now = _now_ts()
+    with _locked_conn() as conn:
+        cur = conn.execute(_SQL_INSERT_NEWS, (title, content, now))
         conn.commit()
         return cur.lastrowid
 
 
-def get_news(limit: int = 50) -> List[Dict[str, Any]]:
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM news ORDER BY created_at DESC LIMIT ?", (limit,))
-        rows = cur.fetchall()
-        return [dict(r) for r in rows]
+def add_news_bulk(items: List[Tuple[str, str]]) -> None:
+    """Insert many (title, content) news items in one transaction."""
+    now = _now_ts()
+    with _locked_conn() as conn:
+        conn.execute("BEGIN")
+        conn.executemany(_SQL_INSERT_NEWS, [(t, c, now) for t, c in items])
+        conn.commit()
+
+
+def get_news(limit: int = 50) -> List[sqlite3.Row]:
+    with _locked_conn() as conn:
+        return conn.execute(_SQL_GET_NEWS, (limit,)).fetchall()
 
 
 def get_news_by_id(item_id: int) -> Optional[Dict[str, Any]]:
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM news WHERE id = ?", (item_id,))
-        row = cur.fetchone()
+    with _locked_conn() as conn:
+        row = conn.execute(_SQL_GET_NEWS_BY_ID, (item_id,)).fetchone()
         return dict(row) if row else None
 
 
 ### Requests helpers
 
 
+# Physical requests column -> logical field, in insert order. Legacy DBs may
+# carry old column names (student_name, type, created_date); fill both.
+_REQUESTS_COL_MAP = (
+    ("requester_name", "requester_name"),
+    ("student_name", "requester_name"),
+    ("request_type", "request_type"),
+    ("type", "request_type"),
+    ("description", "description"),
+    ("room", "room"),
+    ("status", "status"),
+    ("created_at", "created_at"),
+    ("created_date", "created_at"),
+)
+
+# Filled by _cache_requests_schema() (from init_db or on first insert)
+_REQUESTS_COLUMNS: Optional[frozenset] = None
+_REQUESTS_INSERT_SQL: Optional[str] = None
+_REQUESTS_INSERT_FIELDS: List[str] = []
+
+
+def _cache_requests_schema(requests_columns: Iterable[str]) -> None:
+    """Remember the requests columns and precompute the INSERT statement."""
+    global _REQUESTS_COLUMNS, _REQUESTS_INSERT_SQL, _REQUESTS_INSERT_FIELDS
+    # adapt to existing column names in legacy DBs
+    columns = frozenset(requests_columns)
+
+    cols = [col for col, _ in _REQUESTS_COL_MAP if col in columns]
+    fields = [field for col, field in _REQUESTS_COL_MAP if col in columns]
+    placeholders = ','.join(['?'] * len(cols))
+
+    _REQUESTS_COLUMNS = columns
+    _REQUESTS_INSERT_FIELDS = fields
+    _REQUESTS_INSERT_SQL = f"INSERT INTO requests ({', '.join(cols)}) VALUES ({placeholders})" if cols else None
+
+
+def _requests_insert(conn: sqlite3.Connection) -> Tuple[str, List[str]]:
+    """Return (INSERT sql, logical fields in bind order) for the requests table."""
+    if _REQUESTS_COLUMNS is None:
+        _cache_requests_schema(r[1] for r in conn.execute("PRAGMA table_info(requests)"))
+    if _REQUESTS_INSERT_SQL is None:
+        raise RuntimeError('No compatible columns found in requests table')
+    return _REQUESTS_INSERT_SQL, _REQUESTS_INSERT_FIELDS
+
+
+def _request_values(
+    fields: List[str],
+    requester_name: Optional[str],
+    request_type: str,
+    description: str,
+    room: Optional[str],
+    now: int,
+) -> tuple:
+    values = {
+        "requester_name": requester_name,
+        "request_type": request_type,
+        "description": description,
+        "room": room,
+        "status": "open",
+        "created_at": now,
+    }
+    return tuple(values[f] for f in fields)
+
+
 def add_request(
     requester_name: Optional[str], request_type: str, description: str, room: Optional[str]
 ) -> int:
-    now = _now_iso()
-    with get_conn() as conn:
-        cur = conn.cursor()
-        # adapt to existing column names in legacy DBs
-
-        cur.execute("PRAGMA table_info(requests)")
-        info_rows = cur.fetchall()
-        existing = [r[1] for r in info_rows]
-        notnull_map = {r[1]: r[3] for r in info_rows}
-
-        cols = []
-        vals = []
-
-        # requester/student name: prefer new column, but if old exists also fill it
-        if 'requester_name' in existing:
-            cols.append('requester_name'); vals.append(requester_name)
-        if 'student_name' in existing and 'student_name' not in cols:
-            cols.append('student_name'); vals.append(requester_name)
-
-        # request type: fill both possible names if present
-        if 'request_type' in existing:
-            cols.append('request_type'); vals.append(request_type)
-        if 'type' in existing and 'type' not in cols:
-            cols.append('type'); vals.append(request_type)
-
-        # description
-        if 'description' in existing:
-            cols.append('description'); vals.append(description)
-
-        # room
-        if 'room' in existing:
-            cols.append('room'); vals.append(room)
-
-        # status
-        if 'status' in existing:
-            cols.append('status'); vals.append('open')
-
-        # created_at / created_date
-        if 'created_at' in existing:
-            cols.append('created_at'); vals.append(now)
-        if 'created_date' in existing and 'created_date' not in cols:
-            cols.append('created_date'); vals.append(now)
-
-        if not cols:
-            raise RuntimeError('No compatible columns found in requests table')
-
-        placeholders = ','.join(['?'] * len(cols))
-        sql = f"INSERT INTO requests ({', '.join(cols)}) VALUES ({placeholders})"
-        cur.execute(sql, tuple(vals))
+    now = _now_ts()
+    with _locked_conn() as conn:
+        sql, fields = _requests_insert(conn)
+        cur = conn.execute(sql, _request_values(fields, requester_name, request_type, description, room, now))
         conn.commit()
         return cur.lastrowid
 
 
-def get_requests(limit: int = 100) -> List[Dict[str, Any]]:
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM requests ORDER BY created_at DESC LIMIT ?", (limit,))
-        return [dict(r) for r in cur.fetchall()]
+def add_requests_bulk(
+    items: List[Tuple[Optional[str], str, str, Optional[str]]]
+) -> None:
+    """Insert many (requester_name, request_type, description, room) rows in one transaction."""
+    now = _now_ts()
+    with _locked_conn() as conn:
+        sql, fields = _requests_insert(conn)
+        conn.execute("BEGIN")
+        conn.executemany(sql, [_request_values(fields, *item, now) for item in items])
+        conn.commit()
+
+
+def get_requests(limit: int = 100) -> List[sqlite3.Row]:
+    """Return recent requests as rows of (id, request_type, status, created_at, description, room)."""
+    with _locked_conn() as conn:
+        return conn.execute(_SQL_GET_REQUESTS, (limit,)).fetchall()
 
 
 def clear_requests() -> int:
     """Delete all requests and return number of deleted rows."""
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM requests")
-        before = cur.fetchone()[0]
-        cur.execute("DELETE FROM requests")
+    with _locked_conn() as conn:
+        deleted = conn.execute(_SQL_DELETE_REQUESTS).rowcount
+        # reset the AUTOINCREMENT counter in the same transaction
+        conn.execute(_SQL_RESET_REQUESTS_SEQ)
         conn.commit()
-        return before
+        # give freed pages back to the filesystem (no-op unless auto_vacuum=INCREMENTAL);
+        # the pragma frees one page per step and execute() would stop after the
+        # first, so run it as a script to completion
+        conn.executescript("PRAGMA incremental_vacuum")
+        return deleted
 
 
 def get_requests_by_room(room: str) -> List[Dict[str, Any]]:
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM requests WHERE room = ? ORDER BY created_at DESC", (room,))
-        return [dict(r) for r in cur.fetchall()]
+    with _locked_conn() as conn:
+        rows = conn.execute(_SQL_GET_REQUESTS_BY_ROOM, (room,)).fetchall()
+        return [dict(r) for r in rows]
 
 
 def update_request_status(request_id: int, status: str) -> bool:
-    now = _now_iso()
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE requests SET status = ?, updated_at = ? WHERE id = ?", (status, now, request_id)
-        )
+    now = _now_ts()
+    with _locked_conn() as conn:
+        cur = conn.execute(_SQL_UPDATE_REQUEST_STATUS, (status, now, request_id))
         conn.commit()
         return cur.rowcount > 0
 
@@ -324,34 +504,33 @@ def update_request_status(request_id: int, status: str) -> bool:
 
 
 def add_handbook_item(title: str, content: str = "", parent_id: Optional[int] = None, sort_order: int = 0) -> int:
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO handbook (parent_id, title, content, sort_order) VALUES (?, ?, ?, ?)",
-            (parent_id, title, content, sort_order),
-        )
+    with _locked_conn() as conn:
+        cur = conn.execute(_SQL_INSERT_HANDBOOK, (parent_id, title, content, sort_order))
         conn.commit()
         return cur.lastrowid
     
 def delete_handbook_item(title_for_delete: str):
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "DELETE FROM handbook WHERE title = ?",
-            (title_for_delete,),
-        )
+    with _locked_conn() as conn:
+        cur = conn.execute(_SQL_DELETE_HANDBOOK, (title_for_delete,))
         conn.commit()
         return cur.rowcount  
 
 
-def get_handbook_children(parent_id: Optional[int] = None) -> List[Dict[str, Any]]:
-    with get_conn() as conn:
-        cur = conn.cursor()
+def get_handbook_children(parent_id: Optional[int] = None) -> List[sqlite3.Row]:
+    with _locked_conn() as conn:
         if parent_id is None:
-            cur.execute("SELECT * FROM handbook WHERE parent_id IS NULL ORDER BY sort_order, id")
-        else:
-            cur.execute("SELECT * FROM handbook WHERE parent_id = ? ORDER BY sort_order, id", (parent_id,))
-        return [dict(r) for r in cur.fetchall()]
+            return conn.execute(_SQL_GET_HANDBOOK_ROOTS).fetchall()
+        return conn.execute(_SQL_GET_HANDBOOK_CHILDREN, (parent_id,)).fetchall()
+
+
+def get_handbook_subtree(root_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Return all descendants of root_id (None = whole handbook) in one recursive query.
+
+    Rows are ordered by (depth, sort_order, id), so every parent precedes its children.
+    """
+    with _locked_conn() as conn:
+        rows = conn.execute(_SQL_GET_HANDBOOK_SUBTREE, (root_id,)).fetchall()
+        return [dict(r) for r in rows]
 
 
 ### Students & neighbors
@@ -359,64 +538,49 @@ def get_handbook_children(parent_id: Optional[int] = None) -> List[Dict[str, Any
 
 def add_student(full_name: str, room: Optional[str], floor: Optional[str] = None) -> int:
     """Insert a new student and return its id."""
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO students (full_name, room, floor, created_at) VALUES (?, ?, ?, ?)",
-            (full_name, room, floor, _now_iso()),
-        )
+    with _locked_conn() as conn:
+        cur = conn.execute(_SQL_INSERT_STUDENT, (full_name, room, floor, _now_ts()))
         conn.commit()
         return cur.lastrowid
 
 
 def get_student(student_id: int) -> Optional[Dict[str, Any]]:
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM students WHERE id = ?", (student_id,))
-        row = cur.fetchone()
+    with _locked_conn() as conn:
+        row = conn.execute(_SQL_GET_STUDENT, (student_id,)).fetchone()
         return dict(row) if row else None
 
 
-def find_students_by_room(room: str) -> List[Dict[str, Any]]:
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM students WHERE room = ? ORDER BY full_name", (room,))
-        return [dict(r) for r in cur.fetchall()]
+def find_students_by_room(room: str) -> List[sqlite3.Row]:
+    with _locked_conn() as conn:
+        return conn.execute(_SQL_FIND_STUDENTS_BY_ROOM, (room,)).fetchall()
 
 
 def add_neighbor(student_id: int, name: str, contact: Optional[str] = None) -> int:
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO neighbors (student_id, name, contact) VALUES (?, ?, ?)", (student_id, name, contact)
-        )
+    with _locked_conn() as conn:
+        cur = conn.execute(_SQL_INSERT_NEIGHBOR, (student_id, name, contact))
         conn.commit()
         return cur.lastrowid
 
 
 def get_neighbors(student_id: int) -> List[Dict[str, Any]]:
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM neighbors WHERE student_id = ?", (student_id,))
-        return [dict(r) for r in cur.fetchall()]
+    with _locked_conn() as conn:
+        rows = conn.execute(_SQL_GET_NEIGHBORS, (student_id,)).fetchall()
+        return [dict(r) for r in rows]
     
 def get_student_by_name_room(full_name: str, room: Optional[str]) -> Optional[Dict[str, Any]]:
-    """Return a student row matching full_name and room, or None."""
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM students WHERE full_name = ? AND room = ? LIMIT 1", (full_name, room))
-        row = cur.fetchone()
+    """Return {"id": ...} for the student matching full_name and room, or None.
+
+    Only the id is selected so the lookup is answered from idx_students_name_room.
+    """
+    with _locked_conn() as conn:
+        row = conn.execute(_SQL_GET_STUDENT_BY_NAME_ROOM, (full_name, room)).fetchone()
         return dict(row) if row else None
 
 
 def update_student(student_id: int, full_name: str, room: Optional[str] = None, floor: Optional[str] = None) -> bool:
     """Update student fields (full_name, room, floor). Returns True if row updated."""
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE students SET full_name = ?, room = ?, floor = ? WHERE id = ?",
-            (full_name, room, floor, student_id),
-        )
+    with _locked_conn() as conn:
+        cur = conn.execute(_SQL_UPDATE_STUDENT, (full_name, room, floor, student_id))
         conn.commit()
         return cur.rowcount > 0
 
@@ -426,9 +590,14 @@ if __name__ == "__main__":
     print("Initializing DB at:", get_db_path())
     init_db()
     print("Database initialized.")
-    # show counts
-    with get_conn() as c:
-        cur = c.cursor()
-        for name in ("news", "requests", "handbook", "students", "neighbors"):
-            cur.execute(f"SELECT COUNT(*) as cnt FROM {name}")
-            print(name, cur.fetchone()[0])
+    # show counts: one query on the connection init_db() already opened
+    with _locked_conn() as c:
+        rows = c.execute(
+            "SELECT 'news', COUNT(*) FROM news"
+            " UNION ALL SELECT 'requests', COUNT(*) FROM requests"
+            " UNION ALL SELECT 'handbook', COUNT(*) FROM handbook"
+            " UNION ALL SELECT 'students', COUNT(*) FROM students"
+            " UNION ALL SELECT 'neighbors', COUNT(*) FROM neighbors"
+        )
+        for name, cnt in rows:
+            print(name, cnt)
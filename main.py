@@ -1,6 +1,7 @@
 # main.py
 import sys
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
 
 from PyQt6.QtWidgets import (
     QApplication,
@@ -10,7 +11,7 @@ from PyQt6.QtWidgets import (
     QPushButton,
     QMessageBox,
 )
-from PyQt6.QtCore import QDateTime, Qt
+from PyQt6.QtCore import QDateTime, Qt, QTimer, QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt6.QtGui import QStandardItemModel, QStandardItem
 
 from window import Ui_MainWindow
@@ -18,6 +19,52 @@ from window import Ui_MainWindow
 import database
 
 
+def format_ts(value: Any) -> str:
+    """Format a stored timestamp for display, in local time.
+
+    Rows store integer Unix seconds (legacy TEXT columns hand them back as
+    digit strings); anything left as ISO text was written with utcnow().
+    """
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if isinstance(value, int):
+        return datetime.fromtimestamp(value).isoformat(timespec="seconds")
+    if not value:
+        return ""
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone().replace(tzinfo=None).isoformat(timespec="seconds")
+
+
+class DBWorkerSignals(QObject):
+    """Signals for DBWorker (QRunnable is not a QObject and cannot own signals)."""
+
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+
+class DBWorker(QRunnable):
+    """Run a database call on the global thread pool and report the result via signals."""
+
+    def __init__(self, fn: Callable[..., Any], *args: Any):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.signals = DBWorkerSignals()
+
+    def run(self) -> None:
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            self.signals.failed.emit(e)
+            return
+        self.signals.finished.emit(result)
+
+
 class DormHelper(QMainWindow):
 
     def __init__(self):
@@ -25,11 +72,18 @@ class DormHelper(QMainWindow):
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
 
-        # DB reference
+        # DB reference; make sure schema, migrations and indexes are in place
         self.db = database
+        try:
+            self.db.init_db()
+        except Exception as e:
+            self.statusBar().showMessage(f"Ошибка инициализации базы: {e}")
 
         # News model (QListView requires a model)
         self.news_model = QStandardItemModel(self)
+
+        # Bumped on every load_requests(); only the latest result is shown
+        self._requests_load_seq = 0
         self.ui.newsList.setModel(self.news_model)
 
         # Connect signals
@@ -71,6 +125,14 @@ class DormHelper(QMainWindow):
                 self.confirmInfoBtn.setParent(self)
         self.confirmInfoBtn.clicked.connect(self.on_confirm_info_clicked)
 
+        # Keep SQLite planner statistics fresh in this long-running process
+        self.optimizeTimer = QTimer(self)
+        self.optimizeTimer.setInterval(15 * 60 * 1000)
+        self.optimizeTimer.timeout.connect(self.optimize_db)
+        self.optimizeTimer.start()
+        # sqlite recommends PRAGMA optimize right before closing the connection
+        QApplication.instance().aboutToQuit.connect(self.on_about_to_quit)
+
         # Initial loads
         self.load_news()
         self.load_requests()
@@ -78,21 +140,52 @@ class DormHelper(QMainWindow):
         # show neighbors for any prefilled room
         self.load_neighbors_for_room()
 
+    def on_about_to_quit(self) -> None:
+        """Drop queued DB jobs, wait for running ones, then optimize and close the DB."""
+        self.optimizeTimer.stop()
+        pool = QThreadPool.globalInstance()
+        pool.clear()
+        pool.waitForDone()
+        self.db.close_conn()
+
+    def optimize_db(self) -> None:
+        """Periodic PRAGMA optimize (driven by optimizeTimer), run off the GUI thread."""
+        self.run_db(
+            self.db.optimize,
+            on_done=lambda _: None,
+            on_error=lambda e: self.statusBar().showMessage(f"Ошибка оптимизации базы: {e}"),
+        )
+
+    def run_db(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        on_done: Callable[[Any], None],
+        on_error: Callable[[Exception], None],
+    ) -> None:
+        """Run `fn(*args)` off the GUI thread; slots are called back on the GUI thread."""
+        worker = DBWorker(fn, *args)
+        worker.signals.finished.connect(on_done)
+        worker.signals.failed.connect(on_error)
+        QThreadPool.globalInstance().start(worker)
+
     # -------------------- News --------------------
     def load_news(self) -> None:
-        """Load latest news from DB and populate the list."""
-        self.news_model.clear()
-        try:
-            items = self.db.get_news(limit=100)
-        except Exception as e:
-            self.statusBar().showMessage(f"Ошибка загрузки новостей: {e}")
-            return
+        """Load latest news from DB (in the background) and populate the list."""
+        self.run_db(
+            self.db.get_news,
+            100,
+            on_done=self._on_news_loaded,
+            on_error=lambda e: self.statusBar().showMessage(f"Ошибка загрузки новостей: {e}"),
+        )
 
+    def _on_news_loaded(self, items) -> None:
+        self.news_model.clear()
         for item in items:
-            title = item.get("title") or "(без названия)"
-            content = item.get("content") or ""
-            nid = item.get("id")
-            created = item.get("created_at") or ""
+            title = item["title"] or "(без названия)"
+            content = item["content"] or ""
+            nid = item["id"]
+            created = format_ts(item["created_at"])
             display_text = f"{title} — {created}"
             it = QStandardItem(display_text)
             # store id and full content in user roles
@@ -132,48 +225,75 @@ class DormHelper(QMainWindow):
             self.statusBar().showMessage("Номер комнаты должен быть положительным")
             return
 
+        # no second submit while this one is in flight
+        self.ui.submitRequestBtn.setEnabled(False)
+        self.run_db(
+            self.db.add_request,
+            requester_name,
+            request_type,
+            description,
+            room,
+            on_done=self._on_request_submitted,
+            on_error=self._on_request_failed,
+        )
 
-        try:
-            req_id = self.db.add_request(requester_name, request_type, description, room)
-        except Exception as e:
-            self.statusBar().showMessage(f"Ошибка при отправке заявки: {e}")
-            return
+    def _on_request_failed(self, e: Exception) -> None:
+        self.ui.submitRequestBtn.setEnabled(True)
+        self.statusBar().showMessage(f"Ошибка при отправке заявки: {e}")
 
+    def _on_request_submitted(self, req_id: int) -> None:
+        self.ui.submitRequestBtn.setEnabled(True)
         self.statusBar().showMessage(f"Заявка отправлена (ID={req_id})")
         # clear description after submit
         self.ui.requestDescription.clear()
         # reload requests list
         self.load_requests()
 
-    def load_requests(self) -> None:
-        """Load recent requests and populate the requests table (simple view)."""
-        try:
-            rows = self.db.get_requests(limit=200)
-        except Exception as e:
-            self.statusBar().showMessage(f"Ошибка загрузки заявок: {e}")
-            return
+    def load_requests(self, status: Optional[str] = None) -> None:
+        """Load recent requests (in the background) and populate the requests table (simple view).
 
+        `status`, if given, is shown once the table is filled instead of the default row count.
+        """
+        self._requests_load_seq += 1
+        seq = self._requests_load_seq
+        self.run_db(
+            self.db.get_requests,
+            200,
+            on_done=lambda rows: self._on_requests_loaded(rows, seq, status),
+            on_error=lambda e: self.statusBar().showMessage(f"Ошибка загрузки заявок: {e}"),
+        )
+
+    def _on_requests_loaded(self, rows, seq: int, status: Optional[str] = None) -> None:
+        if seq != self._requests_load_seq:
+            # a newer load_requests() was started; its result will replace this one
+            return
         table = self.ui.myRequestsTable
-        table.setRowCount(0)
-        for r in rows:
-            row = table.rowCount()
-            table.insertRow(row)
-            # ID
-            table.setItem(row, 0, QTableWidgetItem(str(r.get("id"))))
-            # Type
-            table.setItem(row, 1, QTableWidgetItem(r.get("request_type") or ""))
-            # Status
-            table.setItem(row, 2, QTableWidgetItem(r.get("status") or ""))
-            # Date — display created_at or empty
-            created = r.get("created_at") or ""
-            table.setItem(row, 3, QTableWidgetItem(created))
-            # description
-            table.setItem(row, 4, QTableWidgetItem(r.get("description")))
-            # room
-            table.setItem(row, 5, QTableWidgetItem(r.get("room")))
-
-
-        self.statusBar().showMessage(f"Заявки загружены: {len(rows)}")
+        # fill in one batch: no repaints or itemChanged signals per cell
+        table.setUpdatesEnabled(False)
+        table.blockSignals(True)
+        try:
+            table.setRowCount(0)
+            table.setRowCount(len(rows))
+            # rows are (id, request_type, status, created_at, description, room)
+            for row, r in enumerate(rows):
+                # ID
+                table.setItem(row, 0, QTableWidgetItem(str(r[0])))
+                # Type
+                table.setItem(row, 1, QTableWidgetItem(r[1] or ""))
+                # Status
+                table.setItem(row, 2, QTableWidgetItem(r[2] or ""))
+                # Date — display created_at or empty
+                created = format_ts(r[3])
+                table.setItem(row, 3, QTableWidgetItem(created))
+                # description
+                table.setItem(row, 4, QTableWidgetItem(r[4]))
+                # room
+                table.setItem(row, 5, QTableWidgetItem(r[5]))
+        finally:
+            table.blockSignals(False)
+            table.setUpdatesEnabled(True)
+
+        self.statusBar().showMessage(status or f"Заявки загружены: {len(rows)}")
 
     def on_clear_requests_clicked(self) -> None:
         """Ask for confirmation and clear all requests from DB."""
@@ -186,49 +306,53 @@ class DormHelper(QMainWindow):
         if reply != QMessageBox.StandardButton.Yes:
             return
 
-        try:
-            deleted = self.db.clear_requests()
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось очистить историю заявок: {e}")
-            return
+        # DELETE + incremental_vacuum can take a while; keep it off the GUI thread
+        self.clearRequestsBtn.setEnabled(False)
+        self.run_db(
+            self.db.clear_requests,
+            on_done=self._on_requests_cleared,
+            on_error=self._on_clear_requests_failed,
+        )
 
-        self.load_requests()
-        self.statusBar().showMessage(f"История заявок очищена ({deleted} записей удалено)")
+    def _on_clear_requests_failed(self, e: Exception) -> None:
+        self.clearRequestsBtn.setEnabled(True)
+        QMessageBox.critical(self, "Ошибка", f"Не удалось очистить историю заявок: {e}")
+
+    def _on_requests_cleared(self, deleted: int) -> None:
+        self.clearRequestsBtn.setEnabled(True)
+        # shown after the reload so the row-count message does not replace it
+        self.load_requests(status=f"История заявок очищена ({deleted} записей удалено)")
 
     # -------------------- Handbook --------------------
     def load_handbook(self) -> None:
-        """Load handbook root items and recursively populate the tree."""
-        self.ui.handbookTree.clear()
+        """Load the whole handbook tree in one background (recursive CTE) query."""
+        self.run_db(
+            self.db.get_handbook_subtree,
+            None,
+            on_done=self._on_handbook_loaded,
+            on_error=lambda e: self.statusBar().showMessage(f"Ошибка загрузки справочника: {e}"),
+        )
 
-        try:
-            roots = self.db.get_handbook_children(None)
-        except Exception as e:
-            self.statusBar().showMessage(f"Ошибка загрузки справочника: {e}")
-            return
+    def _on_handbook_loaded(self, nodes) -> None:
+        self.ui.handbookTree.clear()
 
-        for node in roots:
-            item = QTreeWidgetItem([node.get("title") or "(раздел)"])
+        # rows arrive ordered by (depth, sort_order, id): parents always come first
+        items = {}
+        roots = 0
+        for node in nodes:
+            parent = items.get(node.get("parent_id"))
+            if parent is None:
+                item = QTreeWidgetItem([node.get("title") or "(раздел)"])
+                self.ui.handbookTree.addTopLevelItem(item)
+                roots += 1
+            else:
+                item = QTreeWidgetItem([node.get("title") or "(пункт)"])
+                parent.addChild(item)
             item.setData(0, Qt.ItemDataRole.UserRole, node.get("id"))
             item.setData(0, Qt.ItemDataRole.UserRole + 1, node.get("content") or "")
-            self.ui.handbookTree.addTopLevelItem(item)
-            self._load_handbook_children(item)
+            items[node.get("id")] = item
 
-        self.statusBar().showMessage(f"Справочник загружен: {len(roots)} разделов")
-
-    def _load_handbook_children(self, parent_item: QTreeWidgetItem) -> None:
-        parent_id = parent_item.data(0, Qt.ItemDataRole.UserRole)
-        try:
-            children = self.db.get_handbook_children(parent_id)
-        except Exception:
-            children = []
-
-        for node in children:
-            it = QTreeWidgetItem([node.get("title") or "(пункт)"])
-            it.setData(0, Qt.ItemDataRole.UserRole, node.get("id"))
-            it.setData(0, Qt.ItemDataRole.UserRole + 1, node.get("content") or "")
-            parent_item.addChild(it)
-            # recursion
-            self._load_handbook_children(it)
+        self.statusBar().showMessage(f"Справочник загружен: {roots} разделов")
 
     def on_handbook_item_clicked(self, item: QTreeWidgetItem, column: int) -> None:
         content = item.data(0, Qt.ItemDataRole.UserRole + 1) or ""
@@ -254,29 +378,7 @@ class DormHelper(QMainWindow):
 
         # If there are students in the DB for the room, show their names as "neighbors" list
         for s in students:
-            name = s.get("full_name") or "(без имени)"
-            list_widget.addItem(name)
-
-    def load_neighbors_for_room(self) -> None:
-        """Show students/neighbors for given room (basic behavior).
-
-        Uses `find_students_by_room` to locate student(s) and then shows their names in the neighborsList.
-        """
-        room = self.ui.studentRoom.text().strip()
-        list_widget = self.ui.neighborsList
-        list_widget.clear()
-        if not room:
-            return
-
-        try:
-            students = self.db.find_students_by_room(room)
-        except Exception as e:
-            self.statusBar().showMessage(f"Ошибка поиска студентов: {e}")
-            return
-
-        # If there are students in the DB for the room, show their names as "neighbors" list
-        for s in students:
-            name = s.get("full_name") or "(без имени)"
+            name = s["full_name"] or "(без имени)"
             list_widget.addItem(name)
 
     def on_confirm_info_clicked(self) -> None: